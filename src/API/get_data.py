@@ -1,10 +1,15 @@
 """Get the current data of the weather API."""
 
+import random
 import time
 from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import cache
 from os import environ
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
+import numpy as np
 import openmeteo_requests
 import pandas as pd
 import requests_cache
@@ -13,36 +18,45 @@ from loguru import logger
 from openmeteo_requests.Client import WeatherApiResponse
 from retry_requests import retry
 
-load_dotenv()
+from src.API.utils import QuadNode, get_sized_bboxes
+from src.params import QUERY_TEMPLATE
 
+if TYPE_CHECKING:
+    from concurrent.futures import Future
 
-def create_new_rectangles(
-    north: float, south: float, west: float, est: float
-) -> list[tuple[float, float, float, float]]:
-    """Create 4 new sub rectangles.
+    from openmeteo_sdk.VariablesWithTime import VariablesWithTime
 
-    Args:
-        north (float) : float represent the north coordinate
-        south (float) : float represent the south coordinate
-        west (float) : float represent the west coordinate
-        est (float) : float represent the est coordinate
+load_dotenv()
 
-    Returns:
-        - return 4 new sub bounding boxes (top-left, top-right, etc)
+
+@cache
+def get_session() -> requests_cache.CachedSession:
+    """Shared cached session with retries, created on first use.
+
+    The same session (and its open connections) is reused by every call, custom
+    adapters can be mounted on it.
     """
-    mid_lat = (north + south) / 2
-    mid_lon = (west + est) / 2
-    return [
-        (north, mid_lat, west, mid_lon),
-        (north, mid_lat, mid_lon, est),
-        (mid_lat, south, west, mid_lon),
-        (mid_lat, south, mid_lon, est),
-    ]
+    cache_session = requests_cache.CachedSession(
+        ".cache",
+        backend="sqlite",
+        expire_after=3600,
+        # Cache duration (in seconds) depending on how often each source changes
+        urls_expire_after={"*/v1/forecast*": 1800, "*latlong.net*": 604800},
+        # Keep working with the cached responses when the API is down
+        stale_if_error=True,
+        allowable_codes=(200,),
+        cache_control=True,
+    )
+    session: requests_cache.CachedSession = retry(
+        cache_session, retries=5, backoff_factor=0.2
+    )
+    return session
 
 
-def estimate_grid_size(north: float, south: float, west: float, est: float) -> float:
-    """Rough heuristic: 0.1° step ≈ 11 km, used by Open-Meteo models."""
-    return abs(north - south) * abs(est - west) / 0.1**2
+@cache
+def get_client() -> openmeteo_requests.Client:
+    """Shared Open-Meteo API client using the cached session with retries."""
+    return openmeteo_requests.Client(session=get_session())
 
 
 def get_response(
@@ -53,131 +67,183 @@ def get_response(
     west: float,
     est: float,
     params_template: dict[str, Any],
-    waiting_time: int = 70,
+    waiting_time: float = 1,
     max_locations: int = 1000,
     max_retries: int = 2000,
+    max_concurrency: int = 8,
+    max_waiting_time: float = 300,
 ) -> list[list[WeatherApiResponse]]:
-    """Sub cut the bouding boxe to have all the meteo data."""
-    params = params_template.copy()
-    bounding_boxes = deque([(north, south, west, est)])
+    """Sub cut the bouding boxe to have all the meteo data.
+
+    Up to `max_concurrency` boxes are requested at the same time, the results
+    are handled as soon as each request completes. When the rate limit is hit,
+    no request is sent until the pause is over, the pause following a
+    decorrelated jitter backoff between `waiting_time` and `max_waiting_time`.
+    The requests already in flight that hit the same limit
+    are queued again without extending the pause.
+    """
+    # Z-order on the leaves so that close boxes are requested together
+    bounding_boxes = deque(
+        sorted(
+            get_sized_bboxes(north, south, west, est, max_locations=max_locations),
+            key=QuadNode.key,
+        )
+    )
     results = []
-    checked_boxes = set()
+    checked_boxes: set[int] = set()
     failures = 0
+    delay = waiting_time
+    # Rate limit episode: started at `limited_at`, no request is sent before `resume_at`
+    limited_at = resume_at = -float("inf")
+    # Future -> (requested node, time at which the request was sent)
+    pending: dict[Future[list[WeatherApiResponse]], tuple[QuadNode, float]] = {}
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        while (bounding_boxes or pending) and failures < max_retries:
+            pause = resume_at - time.monotonic()
+            if pause > 0 and not pending:
+                time.sleep(pause)
+                pause = 0
+
+            # Fill the pool with the next boxes to request
+            while pause <= 0 and bounding_boxes and len(pending) < max_concurrency:
+                node = bounding_boxes.popleft()
+
+                # Skip duplicate boxes
+                key = node.key()
+                if key in checked_boxes:
+                    continue
+                checked_boxes.add(key)
+
+                # Avoid infinite recursion with too small boxes
+                if node.is_too_small():
+                    logger.debug(f"Skipping too small box {node.bbox}")
+                    continue
+
+                curr_north, curr_south, curr_west, curr_est = node.bbox
+                # Shallow copy, the variable tuples are shared by all the requests
+                params = {
+                    **params_template,
+                    # South, West, North, Est
+                    "bounding_box": f"{curr_south},{curr_west},{curr_north},{curr_est}",
+                }
+                future = executor.submit(openmeteo.weather_api, url, params)
+                pending[future] = (node, time.monotonic())
+
+            if not pending:
+                continue
 
-    while bounding_boxes and failures < max_retries:
-        curr_north, curr_south, curr_west, curr_est = bounding_boxes.popleft()
-
-        # Skip duplicate boxes
-        key = (
-            round(curr_north, 3),
-            round(curr_south, 3),
-            round(curr_west, 3),
-            round(curr_est, 3),
-        )
-        if key in checked_boxes:
-            continue
-        checked_boxes.add(key)
-
-        # Avoid infinite recursion with too small boxes
-        if abs(curr_north - curr_south) < 0.05 or abs(curr_est - curr_west) < 0.05:
-            logger.debug(f"Skipping too small box {key}")
-            continue
-
-        # Estimate whether this box is too large before calling API
-        if (
-            estimate_grid_size(curr_north, curr_south, curr_west, curr_est)
-            > max_locations
-        ):
-            new_boxes = create_new_rectangles(
-                curr_north, curr_south, curr_west, curr_est
+            # Wake up at the end of the rate limit episode to send the next boxes
+            done, _ = wait(
+                pending,
+                timeout=pause if pause > 0 else None,
+                return_when=FIRST_COMPLETED,
             )
-            bounding_boxes.extend(new_boxes)
-            continue
-
-        params["bounding_box"] = (
-            params_template["bounding_box"]
-            .replace("<SOUTH>", str(curr_south))
-            .replace("<NORTH>", str(curr_north))
-            .replace("<WEST>", str(curr_west))
-            .replace("<EST>", str(curr_est))
-        )
-
-        try:
-            result = openmeteo.weather_api(url, params)
-            results.append(result)
-            logger.info(f"Success for box {key}, total results: {len(results)}")
-        except Exception as e:
-            reason = e.args[0] if e.args else str(e)
-
-            if "1000 locations" in reason or "too many" in reason.lower():
-                # Split this box immediately (too large)
-                logger.warning(f"Box too large, splitting {key}")
-                new_boxes = create_new_rectangles(
-                    curr_north, curr_south, curr_west, curr_est
+            for future in done:
+                node, sent_at = pending.pop(future)
+                try:
+                    result = future.result()
+                    results.append(result)
+                    delay = waiting_time
+                    logger.info(
+                        f"Success for box {node.bbox}, total results: {len(results)}"
+                    )
+                except Exception as e:
+                    reason = e.args[0] if e.args else str(e)
+
+                    if "1000 locations" in reason or "too many" in reason.lower():
+                        # Split this box immediately (too large)
+                        logger.warning(f"Box too large, splitting {node.bbox}")
+                        bounding_boxes.extend(node.subdivide())
+                        failures += 1
+
+                    elif "API request limit exceeded" in reason:
+                        # Requests sent before the episode started are part of it
+                        if sent_at > limited_at:
+                            delay = random.uniform(
+                                waiting_time, min(max_waiting_time, delay * 3)
+                            )
+                            limited_at = time.monotonic()
+                            resume_at = limited_at + delay
+                            logger.warning(f"Rate limit hit. Pausing {delay:.1f}s...")
+                        bounding_boxes.appendleft(node)
+                        checked_boxes.discard(node.key())
+
+                    else:
+                        logger.warning(f"Unexpected error for {node.bbox}: {reason}")
+                        time.sleep(2)
+                        failures += 1
+
+                logger.info(
+                    f"Currently have: {len(results)} results and [{failures}/{max_retries}] failures"
                 )
-                bounding_boxes.extend(new_boxes)
-                failures += 1
-
-            elif "API request limit exceeded" in reason:
-                logger.warning(f"Rate limit hit. Sleeping {waiting_time}s...")
-                time.sleep(waiting_time)
-                waiting_time = min(waiting_time * 2, 300)
-                bounding_boxes.appendleft((curr_north, curr_south, curr_west, curr_est))
-                checked_boxes.discard(key)
-
-            else:
-                logger.warning(f"Unexpected error for {key}: {reason}")
-                time.sleep(2)
-                failures += 1
-
-        logger.info(
-            f"Currently have: {len(results)} results and [{failures}/{max_retries}] failures"
-        )
+        for future in pending:
+            future.cancel()
     return results
 
 
-def call_api(
-    url: str, lat: float | int, long: float | int
-) -> tuple[pd.DataFrame, pd.DataFrame]:
-    """Main function that get the responses and add informations together."""
-    cache_session = requests_cache.CachedSession(".cache", expire_after=3600)
-    retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-    openmeteo = openmeteo_requests.Client(session=retry_session)
-    # Setup the Open-Meteo API client with cache and retry on error
-    params = {
-        "latitude": lat,
-        "longitude": long,
-        "daily": [
-            "uv_index_max",
-            "apparent_temperature_max",
-            "apparent_temperature_min",
-        ],
-        "hourly": ["temperature_2m", "rain", "is_day", "sunshine_duration"],
-        "models": ["arpege_europe", "arome_france", "arome_france_hd"],
-        "timezone": "Europe/Berlin",
-        "wind_speed_unit": "ms",
-        "bounding_box": "<SOUTH>,<WEST>,<NORTH>,<EST>",  # South, West, North, Est
-        "start_date": "2025-11-01",  # YYYY-MM-DD
-        "end_date": "2025-11-15",
-    }
+def read_variables(
+    variables: "VariablesWithTime", keys: Sequence[str]
+) -> tuple[pd.DatetimeIndex, np.ndarray]:
+    """Read the dates and values of one hourly/daily response.
 
-    responses = get_response(
-        openmeteo=openmeteo,
-        url=url,
-        north=51.0,
-        south=41.0,
-        west=5.0,
-        est=10.0,
-        params_template=params,
+    The values are written in a single (rows, variables) array, missing variables
+    are left to NaN so that every response has the same columns.
+
+    Args:
+        variables (VariablesWithTime) : hourly or daily part of the response
+        keys (Sequence[str]) : requested variables, in the same order as the request
+
+    Returns:
+        - the dates of the rows and the 2-D array of values
+    """
+    # The number of rows is known, no need to let pandas infer it from the end
+    start, interval = variables.Time(), variables.Interval()
+    dates = pd.date_range(
+        start=pd.Timestamp(start, unit="s", tz="UTC"),
+        periods=(variables.TimeEnd() - start) // interval,
+        freq=pd.Timedelta(seconds=interval),
     )
-    if responses is None:
-        return
-    logger.info(len(responses))
+    values = np.full((len(dates), len(keys)), np.nan, dtype=np.float32)
+    for i in range(len(keys)):
+        variable = variables.Variables(i)
+        if variable is not None:
+            values[:, i] = variable.ValuesAsNumpy()
+    return dates, values
+
 
-    daily_dataframe = pd.DataFrame()
-    hourly_dataframe = pd.DataFrame()
+def build_dataframe(
+    blocks: list[tuple[pd.DatetimeIndex, np.ndarray]], keys: Sequence[str]
+) -> pd.DataFrame:
+    """Build one dataframe from the blocks read in all the responses.
 
-    # Process 1 location and 3 models
+    The blocks are copied once in a single array, the dataframe is then created
+    from it instead of concatenating a dataframe per response.
+    """
+    if not blocks:
+        return pd.DataFrame()
+    dataframe = pd.DataFrame(
+        np.concatenate([values for _, values in blocks]), columns=list(keys)
+    )
+    first_dates, _ = blocks[0]
+    dataframe.insert(0, "date", first_dates.append([dates for dates, _ in blocks[1:]]))
+    return dataframe
+
+
+def get_query_params(lat: float | int | str, long: float | int | str) -> dict[str, Any]:
+    """Parameters of the weather API query for the given location(s)."""
+    return {**QUERY_TEMPLATE, "latitude": lat, "longitude": long}
+
+
+def responses_to_dataframes(
+    responses: list[list[WeatherApiResponse]], params: dict[str, Any]
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Merge the daily and hourly data of all the responses."""
+    # Raw blocks, the dataframes are only built once at the end
+    daily_blocks: list[tuple[pd.DatetimeIndex, np.ndarray]] = []
+    hourly_blocks: list[tuple[pd.DatetimeIndex, np.ndarray]] = []
+
+    # Process each location and the 3 models
     for local_reponse in responses:
         for response in local_reponse:
             print(f"\nCoordinates: {response.Latitude()}°N {response.Longitude()}°E")
@@ -191,54 +257,62 @@ def call_api(
             hourly = response.Hourly()
             if hourly is None:
                 continue
-            hourly_temperature_2m = hourly.Variables(0).ValuesAsNumpy()
-            hourly_rain = hourly.Variables(1).ValuesAsNumpy()
-            hourly_is_day = hourly.Variables(2).ValuesAsNumpy()
-            hourly_sunshine_duration = hourly.Variables(3).ValuesAsNumpy()
-
-            hourly_data: dict[str, Any] = {
-                "date": pd.date_range(
-                    start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-                    end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-                    freq=pd.Timedelta(seconds=hourly.Interval()),
-                    inclusive="left",
-                )
-            }
-
-            hourly_data["temperature_2m"] = hourly_temperature_2m
-            hourly_data["rain"] = hourly_rain
-            hourly_data["is_day"] = hourly_is_day
-            hourly_data["sunshine_duration"] = hourly_sunshine_duration
-
-            current_hourly_data = pd.DataFrame(data=hourly_data)
-            hourly_dataframe = pd.concat([hourly_dataframe, current_hourly_data])
+            hourly_blocks.append(read_variables(hourly, params["hourly"]))
 
             # Process daily data.
             # The order of variables needs to be the same as requested.
             daily = response.Daily()
             if daily is None:
                 continue
-            daily_uv_index_max = daily.Variables(0).ValuesAsNumpy()
-            daily_apparent_temperature_max = daily.Variables(1).ValuesAsNumpy()
-            daily_apparent_temperature_min = daily.Variables(2).ValuesAsNumpy()
-
-            daily_data: dict[str, Any] = {
-                "date": pd.date_range(
-                    start=pd.to_datetime(daily.Time(), unit="s", utc=True),
-                    end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True),
-                    freq=pd.Timedelta(seconds=daily.Interval()),
-                    inclusive="left",
-                )
-            }
+            daily_blocks.append(read_variables(daily, params["daily"]))
+
+    return (
+        build_dataframe(daily_blocks, params["daily"]),
+        build_dataframe(hourly_blocks, params["hourly"]),
+    )
+
+
+def call_api(
+    url: str, lat: float | int, long: float | int
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Main function that get the responses and add informations together."""
+    # Open-Meteo API client with cache and retry on error
+    openmeteo = get_client()
+    params = get_query_params(lat, long)
+
+    responses = get_response(
+        openmeteo=openmeteo,
+        url=url,
+        north=51.0,
+        south=41.0,
+        west=5.0,
+        est=10.0,
+        params_template=params,
+    )
+    if responses is None:
+        return
+    logger.info(len(responses))
+
+    return responses_to_dataframes(responses, params)
 
-            daily_data["uv_index_max"] = daily_uv_index_max
-            daily_data["apparent_temperature_max"] = daily_apparent_temperature_max
-            daily_data["apparent_temperature_min"] = daily_apparent_temperature_min
 
-            current_daily_data = pd.DataFrame(data=daily_data)
-            daily_dataframe = pd.concat([hourly_dataframe, current_daily_data])
+def call_api_batch(
+    url: str, points: list[tuple[float, float]]
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Get the data of several (lat, long) points with a single request.
+
+    The weather API accepts comma separated latitudes and longitudes, so the
+    request overhead is paid once for all the points.
+    """
+    openmeteo = get_client()
+    params = get_query_params(
+        ",".join(str(lat) for lat, _ in points),
+        ",".join(str(long) for _, long in points),
+    )
+    responses = openmeteo.weather_api(url, params)
+    logger.info(f"{len(responses)} responses for {len(points)} points")
 
-    return daily_dataframe, hourly_dataframe
+    return responses_to_dataframes([responses], params)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+"""Geometry helpers to cut the bounding boxes sent to the weather API."""
+
+from math import ceil, log2
+
+import numpy as np
+
+# Smallest side (in degrees) of a box that can still be requested
+MIN_BOX_SIZE = 0.05
+# Bins per degree used to integerize the coordinates of the Z-order codes
+MORTON_BINS_PER_DEGREE = 1000
+# Low bits of a node key that store its depth
+DEPTH_BITS = 5
+
+
+def create_new_rectangles(
+    north: float, south: float, west: float, est: float
+) -> list[tuple[float, float, float, float]]:
+    """Create 4 new sub rectangles.
+
+    Args:
+        north (float) : float represent the north coordinate
+        south (float) : float represent the south coordinate
+        west (float) : float represent the west coordinate
+        est (float) : float represent the est coordinate
+
+    Returns:
+        - return 4 new sub bounding boxes (top-left, top-right, etc)
+    """
+    mid_lat = (north + south) / 2
+    mid_lon = (west + est) / 2
+    return [
+        (north, mid_lat, west, mid_lon),
+        (north, mid_lat, mid_lon, est),
+        (mid_lat, south, west, mid_lon),
+        (mid_lat, south, mid_lon, est),
+    ]
+
+
+def estimate_grid_size(north: float, south: float, west: float, est: float) -> float:
+    """Rough heuristic: 0.1° step ≈ 11 km, used by Open-Meteo models."""
+    return abs(north - south) * abs(est - west) / 0.1**2
+
+
+def max_quadtree_depth(
+    north: float, south: float, west: float, est: float, min_size: float = MIN_BOX_SIZE
+) -> int:
+    """Depth after which the sides of a sub box are smaller than `min_size`."""
+    longest_side = max(abs(north - south), abs(est - west))
+    if longest_side <= min_size:
+        return 0
+    return ceil(log2(longest_side / min_size))
+
+
+def _spread_bits(value: int) -> int:
+    """Insert a 0 bit between each bit of a 32 bits integer."""
+    value &= 0xFFFFFFFF
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    value = (value | (value << 1)) & 0x5555555555555555
+    return value
+
+
+def morton(lat_bin: int, lon_bin: int) -> int:
+    """Z-order (Morton) code interleaving the bits of the latitude/longitude bins."""
+    return _spread_bits(lat_bin) | (_spread_bits(lon_bin) << 1)
+
+
+class QuadNode:
+    """Node of the quadtree that cuts a bounding box in 4 sub boxes."""
+
+    def __init__(self, bbox: tuple[float, float, float, float], depth: int = 0) -> None:
+        """Create a node.
+
+        Args:
+            bbox (tuple) : (north, south, west, est) coordinates of the node
+            depth (int) : depth of the node inside the quadtree
+        """
+        self.bbox = bbox
+        self.depth = depth
+
+    def is_too_small(self, min_size: float = MIN_BOX_SIZE) -> bool:
+        """Whether one side of the box is smaller than `min_size`."""
+        north, south, west, est = self.bbox
+        return abs(north - south) < min_size or abs(est - west) < min_size
+
+    def key(self) -> int:
+        """Z-order code of the north-west corner, with the depth in the low bits.
+
+        Sorting nodes by key keeps close boxes next to each other.
+        """
+        north, _, west, _ = self.bbox
+        code = morton(
+            int((north + 90) * MORTON_BINS_PER_DEGREE),
+            int((west + 180) * MORTON_BINS_PER_DEGREE),
+        )
+        return (code << DEPTH_BITS) | self.depth
+
+    def subdivide(self) -> list["QuadNode"]:
+        """Cut the node in 4 sub boxes, one level deeper."""
+        return [
+            QuadNode(bbox, self.depth + 1) for bbox in create_new_rectangles(*self.bbox)
+        ]
+
+
+def subdivide_batch(bboxes: np.ndarray) -> np.ndarray:
+    """Vectorized `create_new_rectangles` over a (N, 4) array of boxes.
+
+    Returns:
+        - (4N, 4) array with the 4 children of each box, in the same order as
+          `create_new_rectangles`
+    """
+    north, south, west, est = bboxes.T
+    mid_lat = (north + south) / 2
+    mid_lon = (west + est) / 2
+    children = np.empty((bboxes.shape[0] * 4, 4))
+    children[0::4] = np.stack([north, mid_lat, west, mid_lon], axis=1)
+    children[1::4] = np.stack([north, mid_lat, mid_lon, est], axis=1)
+    children[2::4] = np.stack([mid_lat, south, west, mid_lon], axis=1)
+    children[3::4] = np.stack([mid_lat, south, mid_lon, est], axis=1)
+    return children
+
+
+def get_sized_bboxes(
+    north: float, south: float, west: float, est: float, max_locations: int = 1000
+) -> list[QuadNode]:
+    """Cut the bounding box until each leaf holds at most `max_locations` points.
+
+    The quadtree is built level by level, each level being split in a single
+    NumPy call. Too small leaves are dropped since the API cannot be asked for
+    them.
+    """
+    max_depth = max_quadtree_depth(north, south, west, est)
+    leaves: list[QuadNode] = []
+    level = np.array([[north, south, west, est]])
+    depth = 0
+    while level.size:
+        # estimate_grid_size is element-wise on the columns of the level
+        sizes = np.asarray(estimate_grid_size(*level.T))
+        to_split = (sizes > max_locations) & (depth < max_depth)
+        leaves.extend(
+            QuadNode(tuple(bbox), depth) for bbox in level[~to_split].tolist()
+        )
+        level = subdivide_batch(level[to_split])
+        depth += 1
+    return [leaf for leaf in leaves if not leaf.is_too_small()]
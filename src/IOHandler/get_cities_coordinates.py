@@ -3,41 +3,41 @@
 # %%
 import json
 import re
+from pathlib import Path
 
-from requests import get
+from loguru import logger
 
-url = "https://www.latlong.net/category/cities-76-15.html"
-response = get(url)
-
-
-data = response.text
-# match the entire <a href="/place/..."> ... </a>
-matches = re.findall(r'<a href="/place/(.+?)</a>', data)
-
-all_data = []
-for m in matches:
-    info = m.strip()
-    title_raw = info.split("title=")[1].split(">")[0][1:-2].split(",")[0]
-    info = info.split()
-    informations = {"title": title_raw, "lat_long": info[-1]}
-    all_data.append(informations)
+from src.API.get_data import get_session
 
+url = "https://www.latlong.net/category/cities-76-15.html"
+output_file = Path("data/french_cities_coord.json")
 
-def handle_lat_long(raw_lat_long: str) -> tuple[float, float]:
-    """Convert string to real cooridnates."""
-    # input : 'class="latlong">50.954468,1.862801</span></div>'
-    # output : (50.954468,1.862801)
-    lat, long = raw_lat_long.split(">")[1].split("<")[0].split(",")
-    return (float(lat), float(long))
+# <a href="/place/..." title="<city>, <country>"> ... class="latlong"><lat>,<long><
+# title, latitude and longitude are captured in a single pass over the page
+_CITY_RE = re.compile(
+    r'<a href="/place/(?:(?!</a>).)*?title="(?P<title>[^",]*)'
+    r'(?:(?!</a>).)*?class="latlong">(?P<lat>-?[\d.]+),(?P<long>-?[\d.]+)<'
+)
 
+# Keep-alive session shared with the API, the page is cached for a week
+_SESSION = get_session()
 
-for i, info in enumerate(all_data):
-    lat_long = handle_lat_long(info["lat_long"])
-    all_data[i]["lat_long"] = lat_long
-    print(all_data[i])
 
 # %%
-
-with open("data/french_cities_coord.json", "w", encoding="utf-8") as f:
-    json.dump(all_data, f, indent=4, ensure_ascii=False)
+if output_file.exists():
+    logger.info(f"{output_file} already exists, skipping the download")
+else:
+    response = _SESSION.get(url)
+    all_data = [
+        {
+            "title": match["title"].strip(),
+            "lat_long": (float(match["lat"]), float(match["long"])),
+        }
+        for match in _CITY_RE.finditer(response.text)
+    ]
+    for informations in all_data:
+        print(informations)
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(all_data, f, indent=4, ensure_ascii=False)
 # %%
@@ -1,6 +1,8 @@
 """The french map with meteo informations on it."""
 
 import json
+from collections.abc import Callable, Sequence
+from functools import lru_cache
 from typing import Any
 
 import cv2 as cv
@@ -12,67 +14,96 @@ from src.params import LIMIT_EST, LIMIT_NORTH, LIMIT_SOUTH, LIMIT_WEST
 
 load_dotenv()
 
+# Pixels kept around the mouse label when erasing it
+LABEL_MARGIN = 2
+# Sign of the coordinates depending on their direction
+_SIGN = {"N": 1, "E": 1, "S": -1, "W": -1}
 
+
+@lru_cache(maxsize=256)
 def parse_coordinate(coord_str: str) -> float:
-    """Transform string coordinates to angle."""
+    """Transform string coordinates to angle (cached, the same few are parsed)."""
     # Remove degree symbol and extract direction
     parts = coord_str.split()
-    degrees = float(parts[0])
     minutes = float(parts[1]) if len(parts) > 2 and parts[1].isdigit() else 0
-    direction = parts[-1]
+    # Sign based on direction, without branching on it
+    return _SIGN.get(parts[-1], 1) * (float(parts[0]) + minutes / 60)
+
+
+def parse_limits(limits: Sequence[str]) -> tuple[float, float, float, float]:
+    """Parse the (west, east, north, south) limits of the map once."""
+    return _parse_limits(tuple(limits))
+
+
+@lru_cache(maxsize=8)
+def _parse_limits(limits: tuple[str, ...]) -> tuple[float, float, float, float]:
+    """Cached `parse_limits`, the limits never change at runtime."""
+    west, east, north, south = map(parse_coordinate, limits)
+    return (west, east, north, south)
+
 
-    decimal = degrees + minutes / 60
+# Parsed (west, east, north, south) limits of the default map, as floats
+DEFAULT_LIMITS = parse_limits([LIMIT_WEST, LIMIT_EST, LIMIT_NORTH, LIMIT_SOUTH])
 
-    # Apply sign based on direction
-    if direction in ["W", "S"]:
-        decimal = -decimal
 
-    return decimal
+@lru_cache(maxsize=4)
+def make_projector(
+    width: int, height: int, limits: tuple[float, float, float, float]
+) -> tuple[Callable[[int], float], Callable[[int], float]]:
+    """Pixel to (longitude, latitude) converters for an image size and its limits.
 
+    The scales are computed once, each conversion is then a single multiply-add.
+    """
+    west, east, north, south = limits
+    scale_x = (east - west) / width
+    scale_y = (south - north) / height
 
-def get_longitude(x: int, max_cols: int, limits: list[str]) -> float:
-    """Convert pixel x-coordinate to longitude."""
-    west_limit = parse_coordinate(limits[0])
-    east_limit = parse_coordinate(limits[1])
-    longitude = west_limit + (x / max_cols) * (east_limit - west_limit)
-    return round(longitude, 6)
+    def lon_of_x(x: int) -> float:
+        return round(west + scale_x * x, 6)
 
+    def lat_of_y(y: int) -> float:
+        return round(north + scale_y * y, 6)
 
-def get_latitude(y: int, max_y: int, limits: list[str]) -> float:
-    """Convert pixel y-coordinate to latitude."""
-    north_limit = parse_coordinate(limits[2])
-    south_limit = parse_coordinate(limits[3])
-    latitude = north_limit - (y / max_y) * (north_limit - south_limit)
-    return round(latitude, 6)
+    return lon_of_x, lat_of_y
 
 
-def get_coord_from_lat_long(
-    lat: float, long: float, number_lines: int, number_col: int, limits: list[str]
-) -> tuple[int, int] | None:
-    """Convert latitude and longitude to pixel coordinates (x, y)."""
-    # Parse the geographical limits
-    west_limit = parse_coordinate(limits[0])
-    east_limit = parse_coordinate(limits[1])
-    north_limit = parse_coordinate(limits[2])
-    south_limit = parse_coordinate(limits[3])
+def project_cities(
+    cities: list[dict[str, Any]],
+    number_lines: int,
+    number_col: int,
+    limits: tuple[float, float, float, float],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Project the cities to the (x, y) pixels of the map, all at once.
 
-    # Check if coordinates are within bounds
-    if not (west_limit <= long <= east_limit and south_limit <= lat <= north_limit):
-        return None
+    The limits are the parsed (west, east, north, south) limits of the map.
 
-    # Convert longitude to x coordinate (west to east = 0 to number_col)
-    x = int((long - west_limit) / (east_limit - west_limit) * number_col)
+    Returns:
+        - x and y pixel coordinates of each city, and the mask of the cities
+          that are drawable on the map (not on the border of the image)
+    """
+    # (N, 2) array of the coordinates, built in a single pass over the cities
+    coords = np.array([city["lat_long"] for city in cities], dtype=float).reshape(-1, 2)
+    lats, longs = coords.T
+    return _project_batch(lats, longs, number_lines, number_col, limits)
 
-    # Convert latitude to y coordinate (north to south = 0 to number_lines)
-    y = int((north_limit - lat) / (north_limit - south_limit) * number_lines)
 
-    # Ensure coordinates are within image bounds
-    x = max(0, min(x, number_col - 1))
-    y = max(0, min(y, number_lines - 1))
-    if x == 0 or x == number_col - 1 or y == 0 or y == number_lines - 1:
-        return None
+def _project_batch(
+    lats: np.ndarray,
+    longs: np.ndarray,
+    number_lines: int,
+    number_col: int,
+    limits: tuple[float, float, float, float],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Project the latitude/longitude arrays to pixels, see `project_cities`."""
+    west_limit, east_limit, north_limit, south_limit = limits
+    # West to east is x = 0 to number_col, north to south is y = 0 to number_lines
+    xs = ((longs - west_limit) / (east_limit - west_limit) * number_col).astype(int)
+    ys = ((north_limit - lats) / (north_limit - south_limit) * number_lines).astype(int)
 
-    return (x, y)
+    # Inside the pixel bounds implies inside the limits: the points out of the
+    # limits are projected to x <= 0, x >= number_col, etc.
+    inside = (xs > 0) & (xs < number_col - 1) & (ys > 0) & (ys < number_lines - 1)
+    return xs, ys, inside
 
 
 def handle_mouse_move(
@@ -82,21 +113,59 @@ def handle_mouse_move(
     logger.debug(f"{x}, {y}, {event}, {flags}")
     if params is None:
         return
-    copy_image = params["image"].copy()
-    limits = params["limits"]
-    nl, nc, _ = copy_image.shape
-    lat = get_latitude(y, nl, limits=limits)
-    long = get_longitude(x, nc, limits=limits)
+    if params.get("scratch") is None:
+        reset_scratch(params)
+    # Same pixel as the last event, the label would be the same
+    if params.get("last_mouse") == (x, y):
+        return
+    params["last_mouse"] = (x, y)
+    image = params["image"]
+    scratch = params["scratch"]
+
+    # Only erase the previous label instead of copying the whole image
+    if params.get("label_box") is not None:
+        x0, y0, x1, y1 = params["label_box"]
+        scratch[y0:y1, x0:x1] = image[y0:y1, x0:x1]
+
+    if "parsed_limits" not in params:
+        # Fallback when the params were not set up by `display_map`
+        params["parsed_limits"] = parse_limits(params["limits"])
+    nl, nc, _ = scratch.shape
+    lon_of_x, lat_of_y = make_projector(nc, nl, params["parsed_limits"])
+    lat = lat_of_y(y)
+    long = lon_of_x(x)
+    text = f"({lat}, {long})"
+    (text_w, text_h), baseline = cv.getTextSize(text, cv.FONT_HERSHEY_COMPLEX, 1, 2)
+    params["label_box"] = (
+        max(0, x - LABEL_MARGIN),
+        # Glyphs like parenthesis go above the text height
+        max(0, y - text_h - baseline - LABEL_MARGIN),
+        min(nc, x + text_w + LABEL_MARGIN),
+        min(nl, y + baseline + LABEL_MARGIN),
+    )
     cv.putText(
-        copy_image,
-        f"({lat}, {long})",
+        scratch,
+        text,
         (x, y),
         cv.FONT_HERSHEY_COMPLEX,
         1,
         (0, 255, 0),
         2,
     )
-    cv.imshow(params["win_name"], copy_image)
+    cv.imshow(params["win_name"], scratch)
+
+
+def reset_scratch(params: dict[str, Any]) -> None:
+    """Sync the buffer used to draw the mouse label with the current image."""
+    if (
+        params.get("scratch") is None
+        or params["scratch"].shape != params["image"].shape
+    ):
+        params["scratch"] = np.empty_like(params["image"])
+    np.copyto(params["scratch"], params["image"])
+    params["label_box"] = None
+    # The label has to be drawn again at the next mouse event
+    params["last_mouse"] = None
 
 
 def display_map(image: np.ndarray, win_name: str, params: dict[str, Any]) -> None:
@@ -106,6 +175,10 @@ def display_map(image: np.ndarray, win_name: str, params: dict[str, Any]) -> Non
     cv.imshow(winname=win_name, mat=image_copy)
     params["image"] = image_copy
     params["win_name"] = win_name
+    reset_scratch(params)
+    # Parse the limits once instead of at each mouse event
+    if "parsed_limits" not in params:
+        params["parsed_limits"] = parse_limits(params["limits"])
     cv.setMouseCallback(win_name, handle_mouse_move, params)
     while True:
         key = cv.waitKey(1)
@@ -116,45 +189,86 @@ def display_map(image: np.ndarray, win_name: str, params: dict[str, Any]) -> Non
 
 
 def add_cities_to_image(params: dict[str, Any]) -> None:
-    """Add all the cities to the current image (location and name)."""
+    """Add all the cities to the current image (location and name).
+
+    The map with the cities is drawn once and cached in `params["cities_map"]`,
+    toggling the cities then only swaps the displayed image.
+    """
     win_name = params["win_name"]
     if not params["toggle_cities"]:
         params["toggle_cities"] = not params["toggle_cities"]
         params["image"] = params["init_map"]
+        reset_scratch(params)
         cv.imshow(winname=win_name, mat=params["image"])
         return
-    current_map = params["image"]
+    init_map = params["init_map"]
+    nl, nc, _ = init_map.shape
+
+    # The projection only depends on the image size, the limits and the cities
+    size_key = (nl, nc, params["parsed_limits"])
+    if (
+        params.get("city_px_key") != size_key
+        or params.get("city_px_cities") is not params["cities"]
+    ):
+        params["city_px"] = get_cities_pixels(params, number_lines=nl, number_col=nc)
+        params["city_px_key"] = size_key
+        params["city_px_cities"] = params["cities"]
+        params["cities_map"] = None
+
+    if params.get("cities_map") is None:
+        params["cities_map"] = draw_cities(init_map, params["city_px"])
+    params["image"] = params["cities_map"]
+    reset_scratch(params)
+    cv.imshow(winname=win_name, mat=params["image"])
+    params["toggle_cities"] = not params["toggle_cities"]
+
+
+def draw_cities(
+    image: np.ndarray, city_px: list[tuple[dict[str, Any], tuple[int, int]]]
+) -> np.ndarray:
+    """Copy of the image with the name of the cities written at their pixel."""
+    cities_map = image.copy()
+    for city, position in city_px:
+        cv.putText(
+            cities_map,
+            city["title"],
+            position,
+            cv.FONT_HERSHEY_COMPLEX,
+            1,
+            (0, 0, 0),
+            2,
+        )
+    return cities_map
+
+
+def get_cities_pixels(
+    params: dict[str, Any], number_lines: int, number_col: int
+) -> list[tuple[dict[str, Any], tuple[int, int]]]:
+    """Project the cities on the map and drop the ones outside of it."""
     cities: list[dict[str, Any]] = params["cities"]
-    limits = params["limits"]
-    nl, nc, _ = current_map.shape
-    new_cities = []
-    useless_cities = 0
-    for city in cities:
-        lat, long = city["lat_long"]
-        coord = get_coord_from_lat_long(
-            lat=lat, long=long, number_col=nc, number_lines=nl, limits=limits
+    xs, ys, inside = project_cities(
+        cities,
+        number_lines=number_lines,
+        number_col=number_col,
+        limits=params["parsed_limits"],
+    )
+    # Only the drawable cities are visited
+    kept = np.flatnonzero(inside)
+    city_px = [
+        (cities[i], (x, y))
+        for i, x, y in zip(
+            kept.tolist(), xs[kept].tolist(), ys[kept].tolist(), strict=True
+        )
+    ]
+    for i in np.flatnonzero(~inside).tolist():
+        lat, long = cities[i]["lat_long"]
+        logger.warning(
+            f"The current latitude and longitude ({lat}, {long}) of this location does not belong to this map: {cities[i]['title']}"
         )
-        if coord is not None:
-            x, y = coord
-            cv.putText(
-                current_map,
-                city["title"],
-                (x, y),
-                cv.FONT_HERSHEY_COMPLEX,
-                1,
-                (0, 0, 0),
-                2,
-            )
-            cv.imshow(winname=win_name, mat=current_map)
-            new_cities.append(city)
-        else:
-            logger.warning(
-                f"The current latitude and longitude ({lat}, {long}) of this location does not belong to this map: {city['title']}"
-            )
-            useless_cities += 1
-    params["cities"] = new_cities
+    useless_cities = len(cities) - len(city_px)
+    params["cities"] = [city for city, _ in city_px]
     logger.info(f"Deleted {useless_cities} cities")
-    params["toggle_cities"] = not params["toggle_cities"]
+    return city_px
 
 
 if __name__ == "__main__":
@@ -163,12 +277,12 @@ if __name__ == "__main__":
     )
     with open("data/french_cities_coord.json", encoding="utf-8") as f:
         cities = json.load(f)
-    LIMITS = [LIMIT_WEST, LIMIT_EST, LIMIT_NORTH, LIMIT_SOUTH]
     display_map(
         image=map_france,
         win_name="france",
         params={
-            "limits": LIMITS,
+            # Limits of src/params.py, already parsed at import
+            "parsed_limits": DEFAULT_LIMITS,
             "cities": cities,
             "init_map": map_france,
             "toggle_cities": True,
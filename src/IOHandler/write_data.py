@@ -1,76 +1,535 @@
 """File to help to save dataframe into csv files."""
 
+import io
+import os
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Literal
+
+import numpy as np
 import pandas as pd
 from loguru import logger
 
-from src.IOHandler.writting_mods import SaveMode
+from src.IOHandler.writting_mods import ADD, INIT, MERGE
+
+# Binary formats, written with pyarrow
+COLUMNAR_FORMATS = (".parquet", ".feather")
+SAVE_FORMATS = (".csv", *COLUMNAR_FORMATS)
+# Extensions (without the dot) looked up for each filename
+_ALLOWED_EXTS = frozenset(fmt.lstrip(".") for fmt in SAVE_FORMATS)
+_COLUMNAR_EXTS = frozenset(fmt.lstrip(".") for fmt in COLUMNAR_FORMATS)
+PARQUET_ROW_GROUP_SIZE = 50_000
+# Parser of the csv files read back by a merge (pyarrow is multi-threaded)
+CSV_ENGINE: Literal["pyarrow", "c"] = "pyarrow"
+# Default number of threads writing files at the same time
+MAX_WRITE_WORKERS = 8
+# Largest number of rows whose hashes are kept in memory for the next merge
+MERGE_CACHE_MAX_ROWS = 1_000_000
+# Number of files whose row hashes are kept, the least recently merged is dropped
+MERGE_CACHE_MAX_FILES = 4
+# Rows of the csv file read to guess the type of its columns before a merge
+MERGE_TYPE_SAMPLE_ROWS = 1_000
+
+# filename -> ((inode, mtime, size), sep, header, column kinds, hashes of the rows)
+_row_hashes: OrderedDict[
+    str, tuple[tuple[int, int, int], str, str, tuple[str, ...], set[int]]
+] = OrderedDict()
+_row_hashes_lock = threading.Lock()
+
+
+def _extension(filename: str) -> str:
+    """Extension of the file, without the dot (empty when there is none)."""
+    _, dot, ext = filename.rpartition(".")
+    return ext if dot else ""
+
+
+def _quoted_chars(sep: str) -> tuple[str, ...]:
+    """Characters that make `to_csv` quote a field."""
+    return (sep, '"', "\n", "\r")
+
+
+def _format_values(values: pd.Series | pd.Index, sep: str) -> list[str] | None:
+    """Format the values as `to_csv` does, None if their type is not handled here.
+
+    Numbers, booleans and dates are handled, as well as the text columns that do
+    not need quoting.
+    """
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "biu":
+        strings = values.to_numpy().astype(str)
+    elif isinstance(dtype, pd.DatetimeTZDtype) and str(dtype.tz) == "UTC":
+        dates = values.to_numpy(dtype="datetime64[ns]")
+        if (dates.astype(np.int64) % 1_000_000_000).any():
+            # Sub-second dates
+            return None
+        # Same text as pandas ("2025-11-01 00:00:00+00:00"), but vectorized
+        strings = np.char.add(
+            np.char.replace(np.datetime_as_string(dates, unit="s"), "T", " "),
+            "+00:00",
+        )
+    elif (isinstance(dtype, np.dtype) and dtype.kind == "f") or (
+        pd.api.types.is_datetime64_any_dtype(dtype)
+    ):
+        strings = np.asarray(values.astype(str), dtype=str)
+        # Missing values are written as empty fields
+        strings[np.asarray(values.isna())] = ""
+    elif pd.api.types.infer_dtype(values, skipna=True) == "string":
+        strings = np.asarray(values.astype(str), dtype=str)
+        if any((np.char.find(strings, char) >= 0).any() for char in _quoted_chars(sep)):
+            return None
+        strings[np.asarray(values.isna())] = ""
+    else:
+        return None
+    result: list[str] = strings.tolist()
+    return result
+
+
+def _csv_text(frame: pd.DataFrame, *, sep: str, header: bool, index_label: str) -> str:
+    """Text written by `frame.to_csv`, with a formatter per column when possible.
+
+    The columns are formatted all at once depending on their dtype and the lines
+    are joined in Python, which avoids the generic per-cell formatting of pandas.
+    Falls back to `to_csv` for the frames that may need quoting.
+    """
+    names = [index_label, *map(str, frame.columns)]
+    needs_quoting = any(char in name for name in names for char in _quoted_chars(sep))
+    columns: list[list[str]] = []
+    if not (
+        frame.empty
+        or needs_quoting
+        or frame.columns.duplicated().any()
+        or isinstance(frame.index, pd.MultiIndex)
+    ):
+        formatted = [_format_values(frame.index, sep)]
+        formatted.extend(_format_values(frame[name], sep) for name in frame.columns)
+        columns = [column for column in formatted if column is not None]
+
+    # Some columns are not handled by the fast formatter
+    if len(columns) != len(names):
+        buffer = io.StringIO()
+        frame.to_csv(buffer, sep=sep, header=header, index_label=index_label)
+        return buffer.getvalue()
+
+    lines = [sep.join(row) for row in zip(*columns, strict=True)]
+    if header:
+        lines.insert(0, sep.join(names))
+    lines.append("")
+    return os.linesep.join(lines)
+
+
+def _fast_to_csv(
+    frame: pd.DataFrame,
+    path: str,
+    *,
+    sep: str,
+    mode: Literal["w", "a"],
+    header: bool,
+    index_label: str,
+    durable: bool = False,
+) -> None:
+    """Write the dataframe like `frame.to_csv`, with a single `write` call.
+
+    Args:
+        frame (pd.DataFrame) : dataframe to write
+        path (str) : csv file
+        sep (str) : separator of the fields
+        mode (str) : "w" to overwrite the file, "a" to append to it
+        header (bool) : whether the column names are written
+        index_label (str) : name of the index column
+        durable (bool) : flush the file to the disk (fsync) before returning
+    """
+    data = _csv_text(frame, sep=sep, header=header, index_label=index_label)
+    _write_text(path, data, mode=mode, durable=durable)
+
+
+def _write_text(
+    path: str, data: str, *, mode: Literal["w", "a"], durable: bool = False
+) -> None:
+    """Write the text with a single `write` call on an unbuffered file."""
+    with open(path, f"{mode}b", buffering=0) as f:
+        f.write(data.encode())
+        if durable:
+            os.fsync(f.fileno())
+
+
+@contextmanager
+def _replacing(filename: str) -> Iterator[str]:
+    """Temporary file that replaces `filename` if the block succeeds.
+
+    Readers never see a partially written file, and the original file is kept
+    when the write fails.
+    """
+    tmp_filename = f"{filename}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        yield tmp_filename
+        os.replace(tmp_filename, filename)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+
+def _file_stamp(filename: str) -> tuple[int, int, int]:
+    """Inode, modification time and size of the file.
+
+    Replacing the file always gives a new inode, even when the time and size are
+    the same as before.
+    """
+    stat = os.stat(filename)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _ends_with_newline(filename: str) -> bool:
+    """Whether the last byte of the (non empty) file is a line feed."""
+    with open(filename, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _row_hash(line: str, sep: str) -> int:
+    """Hash of the text of a csv line, without its index field."""
+    return hash(line.partition(sep)[2])
+
+
+def _forget_row_hashes(filename: str) -> None:
+    """Drop the cached row hashes of the file."""
+    with _row_hashes_lock:
+        _row_hashes.pop(filename, None)
+
+
+def _column_kinds(dtypes: pd.Series) -> tuple[str, ...]:
+    """How each column is written in a csv file: bool, integer, float or text."""
+    return tuple(
+        {"b": "b", "i": "i", "u": "i", "f": "f"}.get(dtype.kind, "O")
+        for dtype in dtypes
+    )
+
+
+def _read_row_hashes(
+    filename: str, *, sep: str, header: str, kinds: tuple[str, ...]
+) -> set[int] | None:
+    """Hashes of the rows of the csv file, None if they cannot be compared.
+
+    The hashes are cached with the modification time of the file. The rows cannot
+    be compared line by line when the header differs, when the columns of the
+    file do not have the `kinds` of the dataframe ones (e.g. `10` and `10.0`) or
+    when some fields are quoted (they may span several lines).
+    """
+    stamp = _file_stamp(filename)
+    with _row_hashes_lock:
+        cached = _row_hashes.get(filename)
+        if cached is not None and cached[:4] == (stamp, sep, header, kinds):
+            _row_hashes.move_to_end(filename)
+            return cached[4]
+
+    with open(filename, encoding="utf-8", newline="") as f:
+        if f.readline().rstrip("\r\n") != header:
+            return None
+    sample = pd.read_csv(filename, sep=sep, nrows=MERGE_TYPE_SAMPLE_ROWS)
+    if _column_kinds(sample.dtypes.iloc[1:]) != kinds:
+        return None
+
+    hashes = set()
+    with open(filename, encoding="utf-8", newline="") as f:
+        f.readline()
+        for line in f:
+            if '"' in line:
+                return None
+            hashes.add(_row_hash(line.rstrip("\r\n"), sep))
+    return hashes
+
+
+def _merge_csv(
+    frame: pd.DataFrame,
+    filename: str,
+    *,
+    sep: str,
+    index_label: str,
+    durable: bool = False,
+) -> None:
+    """Merge the dataframe into the csv file without duplicating rows.
+
+    Only the rows of the dataframe that are not already in the file are appended
+    to it, the rows being compared by the hash of their text. The hashes of the
+    file are cached so the next merge into the unchanged file does not read it.
+    """
+    header = sep.join([index_label, *map(str, frame.columns)])
+    kinds = _column_kinds(frame.dtypes)
+    hashes = _read_row_hashes(filename, sep=sep, header=header, kinds=kinds)
+    text = _csv_text(frame, sep=sep, header=False, index_label=index_label)
+    if hashes is None or '"' in text:
+        _rewrite_merged(
+            frame, filename, sep=sep, index_label=index_label, durable=durable
+        )
+        _forget_row_hashes(filename)
+        return
+
+    added: set[int] = set()
+    new_lines = []
+    for line in text.split(os.linesep)[:-1]:
+        row_hash = _row_hash(line, sep)
+        if row_hash not in hashes and row_hash not in added:
+            added.add(row_hash)
+            new_lines.append(line)
+    if new_lines:
+        # The last row must not be continued by the first appended one
+        if not _ends_with_newline(filename):
+            new_lines.insert(0, "")
+        _write_text(
+            filename,
+            os.linesep.join([*new_lines, ""]),
+            mode="a",
+            durable=durable,
+        )
+    # New set, the cached one may be read by another merge of the same file
+    hashes = hashes | added
+
+    if len(hashes) > MERGE_CACHE_MAX_ROWS:
+        _forget_row_hashes(filename)
+        return
+    stamp = _file_stamp(filename)
+    with _row_hashes_lock:
+        _row_hashes[filename] = (stamp, sep, header, kinds, hashes)
+        _row_hashes.move_to_end(filename)
+        while len(_row_hashes) > MERGE_CACHE_MAX_FILES:
+            _row_hashes.popitem(last=False)
+
+
+def _rewrite_merged(
+    frame: pd.DataFrame,
+    filename: str,
+    *,
+    sep: str,
+    index_label: str,
+    durable: bool,
+) -> None:
+    """Rewrite the whole csv file with its rows merged with the dataframe ones.
+
+    Used when the rows cannot be compared by their text, e.g. when the columns of
+    the file and of the dataframe are not the same.
+    """
+    if CSV_ENGINE == "pyarrow" and len(sep) == 1:
+        # Multi-threaded parsing, the pyarrow engine only takes a list as usecols
+        old = pd.read_csv(filename, sep=sep, engine="pyarrow")
+        old.drop(columns=index_label, inplace=True, errors="ignore")
+    else:
+        old = pd.read_csv(filename, sep=sep, usecols=lambda c: c != index_label)
+    merged = pd.concat([old, frame]).drop_duplicates(keep="last")
+    with _replacing(filename) as tmp_filename:
+        _fast_to_csv(
+            merged,
+            tmp_filename,
+            sep=sep,
+            mode="w",
+            header=True,
+            index_label=index_label,
+            durable=durable,
+        )
+
+
+def _write_columnar(
+    frame: pd.DataFrame, filename: str, *, mode: str, index_label: str
+) -> None:
+    """Save the dataframe to a parquet or feather file.
+
+    These formats cannot be appended to: for the ADD and MERGE modes the file is
+    read back and rewritten with the new rows.
+    """
+    is_parquet = _extension(filename) == "parquet"
+    if mode != INIT and os.path.exists(filename):
+        old = pd.read_parquet(filename) if is_parquet else pd.read_feather(filename)
+        if index_label in old.columns:
+            old.set_index(index_label, inplace=True)
+        frame = pd.concat([old, frame])
+        if mode == MERGE:
+            frame = frame.drop_duplicates(keep="last")
+
+    # The index is kept as a column, like in the csv files
+    table = frame.rename_axis(index_label).reset_index()
+    with _replacing(filename) as tmp_filename:
+        if is_parquet:
+            table.to_parquet(
+                tmp_filename,
+                engine="pyarrow",
+                compression="zstd",
+                index=False,
+                row_group_size=PARQUET_ROW_GROUP_SIZE,
+            )
+        else:
+            table.to_feather(tmp_filename, compression="zstd")
+
+
+def _write_one(
+    frame: pd.DataFrame,
+    filename: str,
+    *,
+    sep: str,
+    mode: str,
+    index_label: str,
+    durable: bool,
+) -> None:
+    """Save one dataframe with the given mode, the format is already checked."""
+    # Nothing to add or merge, the file is left untouched
+    if frame.empty and mode != INIT:
+        logger.debug("Empty dataframe, nothing to write to {}", filename)
+        return
+
+    if _extension(filename) in _COLUMNAR_EXTS:
+        logger.opt(lazy=True).info(
+            "Saving {} rows with mode {} to the file: {}",
+            lambda: len(frame),
+            lambda: mode,
+            lambda: filename,
+        )
+        _write_columnar(frame, filename, mode=mode, index_label=index_label)
+        _forget_row_hashes(filename)
+        return
+
+    if mode == MERGE:
+        logger.opt(lazy=True).info(
+            "Starting to merge the data ({} rows) between input and {}",
+            lambda: len(frame),
+            lambda: filename,
+        )
+        _merge_csv(
+            frame,
+            filename,
+            sep=sep,
+            index_label=index_label,
+            durable=durable,
+        )
+    elif mode == ADD:
+        logger.opt(lazy=True).info(
+            "Starting to add data ({} rows) to the current file: {}",
+            lambda: len(frame),
+            lambda: filename,
+        )
+        _fast_to_csv(
+            frame,
+            filename,
+            sep=sep,
+            mode="a",
+            header=False,
+            index_label=index_label,
+            durable=durable,
+        )
+    elif mode == INIT:
+        logger.opt(lazy=True).info(
+            "Creating or overwrtting the data ({} rows) from the file: {}",
+            lambda: len(frame),
+            lambda: filename,
+        )
+        with _replacing(filename) as tmp_filename:
+            _fast_to_csv(
+                frame,
+                tmp_filename,
+                sep=sep,
+                mode="w",
+                header=True,
+                index_label=index_label,
+                durable=durable,
+            )
+        _forget_row_hashes(filename)
 
 
 def save_dataframe(
     dataframes: list[pd.DataFrame] | pd.DataFrame,
     filenames: list[str] | str,
     sep: str = ",",
-    mode: str = SaveMode.INIT,
+    mode: str = INIT,
     index_label: str = "index",
+    *,
+    durable: bool = False,
+    max_workers: int | None = None,
 ) -> None:
-    """Main function that save dataframe to csv files by using the coherent mode."""
+    """Main function that save dataframe to files by using the coherent mode.
+
+    The format depends on the extension of each file: csv, parquet or feather.
+
+    With the MERGE mode, the new rows are appended to a csv file when its columns
+    have the same types as the dataframe ones, the whole file is rewritten with
+    the merged rows otherwise.
+
+    The files are written in parallel by a pool of `max_workers` threads (one per
+    file, up to `MAX_WRITE_WORKERS`, when None).
+    """
     if isinstance(dataframes, pd.DataFrame):
         dataframes = [dataframes]
-        logger.debug("Updating the format of dataframes")
+        logger.trace("Updating the format of dataframes")
     if isinstance(filenames, str):
         filenames = [filenames]
-        logger.debug("Updating the format of filenames")
+        logger.trace("Updating the format of filenames")
 
     if len(dataframes) != len(filenames):
         logger.warning(
-            f"Not the same size between the filename({len(filenames)}) and the dataframes({len(dataframes)})"
+            "Not the same size between the filename({}) and the dataframes({})",
+            len(filenames),
+            len(dataframes),
         )
         return
 
-    mode = mode.upper()
-
-    errors = 0
-    for i, frame in enumerate(dataframes):
-        filename = filenames[i]
-        if filename.endswith(".csv"):
-            if mode == SaveMode.MERGE:
-                logger.info(f"Starting to merge the data between input and {filename}")
-                df = pd.DataFrame(pd.read_csv(filename))
-                if index_label in df.columns:
-                    df = df.drop(columns=index_label)
-                updated_df = pd.concat([df, frame]).drop_duplicates(keep="last")
-                updated_df.to_csv(
-                    path_or_buf=filename, sep=sep, mode="w", index_label=index_label
-                )
-            elif mode == SaveMode.ADD:
-                logger.info(f"Starting to add data to the current file: {filename}")
-                frame.to_csv(
-                    path_or_buf=filename,
-                    sep=sep,
-                    mode="a",
-                    header=False,
-                    index_label=index_label,
-                )
-            elif mode == SaveMode.INIT:
-                logger.info(
-                    f"Creating or overwrtting the data from the file: {filename}"
-                )
-                frame.to_csv(
-                    path_or_buf=filename,
-                    sep=sep,
-                    mode="w",
-                    header=True,
-                    index_label=index_label,
-                )
-        else:
-            logger.warning(f'The filename: {filename} does not the ".csv" format')
-            errors += 1
+    # Accepts the SaveMode members as well as their (any case) values
+    mode = sys.intern(mode.lower())
+
+    # Check all the formats before writing anything
+    extensions = [_extension(name) for name in filenames]
+    bad_filenames = [
+        name
+        for name, ext in zip(filenames, extensions, strict=True)
+        if ext not in _ALLOWED_EXTS
+    ]
+    if bad_filenames:
+        logger.warning(
+            "The filenames: {} are not in a known format ({})",
+            bad_filenames,
+            SAVE_FORMATS,
+        )
+    errors = len(bad_filenames)
+    jobs = [
+        (frame, filename)
+        for frame, filename, ext in zip(dataframes, filenames, extensions, strict=True)
+        if ext in _ALLOWED_EXTS
+    ]
+
+    # Writes to the same file must keep their order
+    if len({filename for _, filename in jobs}) != len(jobs):
+        max_workers = 1
+
+    def write(job: tuple[pd.DataFrame, str]) -> None:
+        frame, filename = job
+        try:
+            _write_one(
+                frame,
+                filename,
+                sep=sep,
+                mode=mode,
+                index_label=index_label,
+                durable=durable,
+            )
+        except Exception as e:
+            logger.error("Error writing to {}: {}", filename, e)
+            raise
+
+    if len(jobs) <= 1 or max_workers == 1:
+        # No thread is worth starting
+        for job in jobs:
+            write(job)
+    else:
+        with ThreadPoolExecutor(
+            max_workers=max_workers or min(MAX_WRITE_WORKERS, len(jobs))
+        ) as executor:
+            # list() waits for all the writes and raises their errors
+            list(executor.map(write, jobs))
 
     if errors == 0:
-        logger.success(f"No errors while using mode: {mode} to save the data")
+        logger.success("No errors while using mode: {} to save the data", mode)
 
 
-if __name__ == "__main__":
+# The demo writes data/temp.csv, it only runs when asked for
+if __name__ == "__main__" and "--demo" in sys.argv:
     df = pd.DataFrame({"sizes": [10, 10, 20], "origines": ["paris", "london", "pekin"]})
     save_dataframe(df, "data/temp.csv")
     df = pd.DataFrame(
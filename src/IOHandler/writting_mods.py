@@ -1,5 +1,6 @@
 """Enum that represent the saving dataframe mode."""
 
+import sys
 from enum import Enum
 
 
@@ -9,3 +10,9 @@ class SaveMode(str, Enum):
     INIT = "init"
     ADD = "add"
     MERGE = "merge"
+
+
+# Plain (interned) values of the modes, compared by `save_dataframe`
+INIT = sys.intern(SaveMode.INIT.value)
+ADD = sys.intern(SaveMode.ADD.value)
+MERGE = sys.intern(SaveMode.MERGE.value)
@@ -1,5 +1,9 @@
 """Param file that handle all the parameters."""
 
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any
+
 # File
 FILE = "data/MN_01_2000-2009.csv"
 
@@ -8,3 +12,20 @@ LIMIT_WEST = "005 48 W"
 LIMIT_EST = "10 E"
 LIMIT_NORTH = "51 30 N"
 LIMIT_SOUTH = "41 N"
+
+# Weather API query, shared (read-only) by all the requests
+QUERY_TEMPLATE: Mapping[str, Any] = MappingProxyType(
+    {
+        "daily": (
+            "uv_index_max",
+            "apparent_temperature_max",
+            "apparent_temperature_min",
+        ),
+        "hourly": ("temperature_2m", "rain", "is_day", "sunshine_duration"),
+        "models": ("arpege_europe", "arome_france", "arome_france_hd"),
+        "timezone": "Europe/Berlin",
+        "wind_speed_unit": "ms",
+        "start_date": "2025-11-01",  # YYYY-MM-DD
+        "end_date": "2025-11-15",
+    }
+)
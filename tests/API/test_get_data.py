@@ -1,29 +1,37 @@
+import threading
 from unittest.mock import Mock, patch
 
+import pytest
+
 from src.API.get_data import (
+    build_dataframe,
     call_api,
-    create_new_rectangles,
-    estimate_grid_size,
+    call_api_batch,
+    get_client,
+    get_query_params,
     get_response,
+    get_session,
+    read_variables,
 )
-
-
-def test_create_new_rectangles():
-    north = 100
-    south = 0
-    west = 50
-    est = 75
-    rectangles = create_new_rectangles(north=north, south=south, west=west, est=est)
-    assert len(rectangles) == 4
-
-
-def test_estimate_grid_size():
-    north = 100
-    south = 0
-    west = 50
-    est = 75
-    estimation = estimate_grid_size(north=north, south=south, west=west, est=est)
-    assert estimation > 1000
+from src.params import QUERY_TEMPLATE
+
+
+@patch("src.API.get_data.requests_cache.CachedSession")
+def test_session_and_client_are_shared(mock_cached_session):
+    """Test that the session and the client are only created once."""
+    get_session.cache_clear()
+    get_client.cache_clear()
+    try:
+        assert get_session() is get_session()
+        assert get_client() is get_client()
+        mock_cached_session.assert_called_once()
+        settings = mock_cached_session.call_args.kwargs
+        assert settings["backend"] == "sqlite"
+        assert settings["stale_if_error"] is True
+        assert "*latlong.net*" in settings["urls_expire_after"]
+    finally:
+        get_session.cache_clear()
+        get_client.cache_clear()
 
 
 def test_get_response():
@@ -44,7 +52,6 @@ def test_get_response():
         "models": ["arpege_europe", "arome_france", "arome_france_hd"],
         "timezone": "Europe/Berlin",
         "wind_speed_unit": "ms",
-        "bounding_box": "<SOUTH>,<WEST>,<NORTH>,<EST>",  # South, West, North, Est
         "start_date": "2025-11-01",  # YYYY-MM-DD
         "end_date": "2025-11-15",
     }
@@ -62,6 +69,11 @@ def test_get_response():
     assert len(result) == 1
     assert result[0] == [mock_response]
     mock_openmeteo.weather_api.assert_called_once()
+    # South, West, North, Est
+    assert (
+        mock_openmeteo.weather_api.call_args.args[1]["bounding_box"]
+        == "48.0,5.0,49.0,6.0"
+    )
 
 
 def test_get_response_box_too_large():
@@ -79,7 +91,6 @@ def test_get_response_box_too_large():
     ].extend(successful_responses)
 
     params = {
-        "bounding_box": "<SOUTH>,<WEST>,<NORTH>,<EST>",
         "daily": ["temperature_max"],
     }
 
@@ -107,7 +118,6 @@ def test_get_response_box_too_small():
     mock_openmeteo.weather_api.return_value = [mock_response]
 
     params = {
-        "bounding_box": "<SOUTH>,<WEST>,<NORTH>,<EST>",
         "daily": ["temperature_max"],
     }
 
@@ -128,6 +138,37 @@ def test_get_response_box_too_small():
     assert mock_openmeteo.weather_api.call_count == 1
 
 
+def test_get_response_concurrent_sub_boxes():
+    """Test that every sub box is requested when dispatched concurrently."""
+    mock_openmeteo = Mock()
+    mock_response = Mock()
+    mock_openmeteo.weather_api.return_value = [mock_response]
+
+    params = {
+        "daily": ["temperature_max"],
+    }
+
+    # A 4x4 degrees box is split once into 4 boxes of 2x2 degrees
+    result = get_response(
+        openmeteo=mock_openmeteo,
+        url="test_url",
+        north=50.0,
+        south=46.0,
+        west=0.0,
+        est=4.0,
+        params_template=params,
+        max_concurrency=4,
+    )
+
+    assert len(result) == 4
+    assert mock_openmeteo.weather_api.call_count == 4
+    requested_boxes = {
+        call.args[1]["bounding_box"]
+        for call in mock_openmeteo.weather_api.call_args_list
+    }
+    assert len(requested_boxes) == 4
+
+
 @patch("src.API.get_data.time.sleep")
 def test_get_response_rate_limit(mock_sleep):
     """Test rate limit handling with exponential backoff."""
@@ -141,7 +182,6 @@ def test_get_response_rate_limit(mock_sleep):
     ]
 
     params = {
-        "bounding_box": "<SOUTH>,<WEST>,<NORTH>,<EST>",
         "daily": ["temperature_max"],
     }
 
@@ -157,10 +197,92 @@ def test_get_response_rate_limit(mock_sleep):
     )
 
     assert len(result) == 1
-    mock_sleep.assert_called_once_with(1)  # Should sleep for waiting_time
+    mock_sleep.assert_called_once()
+    # Decorrelated jitter: between waiting_time and 3 * waiting_time
+    assert 1 <= mock_sleep.call_args.args[0] <= 3
     assert mock_openmeteo.weather_api.call_count == 2
 
 
+@patch("src.API.get_data.time.sleep")
+def test_get_response_rate_limit_single_pause(mock_sleep):
+    """Test that the requests in flight during a rate limit share a single pause."""
+    mock_openmeteo = Mock()
+    mock_response = Mock()
+    lock = threading.Lock()
+    calls = []
+
+    def weather_api(url, params):
+        with lock:
+            calls.append(params["bounding_box"])
+            limited = len(calls) <= 4
+        if limited:
+            raise Exception("API request limit exceeded")
+        return [mock_response]
+
+    mock_openmeteo.weather_api.side_effect = weather_api
+
+    # 4 boxes of 2x2 degrees, all requested at once and all rate limited
+    result = get_response(
+        openmeteo=mock_openmeteo,
+        url="test_url",
+        north=50.0,
+        south=46.0,
+        west=0.0,
+        est=4.0,
+        params_template={"daily": ["temperature_max"]},
+        max_concurrency=4,
+    )
+
+    assert len(result) == 4
+    assert len(calls) == 8
+    mock_sleep.assert_called_once()
+    assert 1 <= mock_sleep.call_args.args[0] <= 3
+
+
+def test_read_variables():
+    """Test that the variables are read in the requested order."""
+    import numpy as np
+
+    mock_variables = Mock()
+    mock_variables.Time.return_value = 1730462400
+    mock_variables.TimeEnd.return_value = 1730469600
+    mock_variables.Interval.return_value = 3600
+    mock_temperature = Mock()
+    mock_temperature.ValuesAsNumpy.return_value = np.array([20.0, 21.0])
+    mock_rain = Mock()
+    mock_rain.ValuesAsNumpy.return_value = np.array([0.5, 0.0])
+    mock_variables.Variables.side_effect = [mock_temperature, None, mock_rain]
+
+    dates, values = read_variables(mock_variables, ["temperature_2m", "is_day", "rain"])
+
+    assert len(dates) == 2
+    assert dates[1] - dates[0] == np.timedelta64(3600, "s")
+    assert values.shape == (2, 3)
+    assert values[:, 0].tolist() == [20.0, 21.0]
+    # Missing variables are left to NaN
+    assert np.isnan(values[:, 1]).all()
+    assert values[:, 2].tolist() == [0.5, 0.0]
+
+
+def test_build_dataframe():
+    import numpy as np
+    import pandas as pd
+
+    first_dates = pd.date_range("2025-11-01", periods=2, freq="h", tz="UTC")
+    second_dates = pd.date_range("2025-11-02", periods=1, freq="h", tz="UTC")
+    blocks = [
+        (first_dates, np.array([[1.0, 2.0], [3.0, 4.0]])),
+        (second_dates, np.array([[5.0, 6.0]])),
+    ]
+
+    dataframe = build_dataframe(blocks, ["a", "b"])
+
+    assert list(dataframe.columns) == ["date", "a", "b"]
+    assert dataframe["a"].tolist() == [1.0, 3.0, 5.0]
+    assert dataframe["date"].tolist() == [*first_dates, *second_dates]
+    assert build_dataframe([], ["a", "b"]).empty
+
+
 @patch("src.API.get_data.get_response")
 def test_call_api_none_response(mock_get_response):
     """Test call_api when get_response returns None."""
@@ -248,9 +370,48 @@ def test_call_api_with_response(mock_get_response):
 
     # Verify the function completed successfully
     assert result is not None  # call_api doesn't return anything when successful
+    daily_dataframe, hourly_dataframe = result
+    assert len(hourly_dataframe) == 2
+    assert len(daily_dataframe) == 1
+    assert daily_dataframe["uv_index_max"].tolist() == [8.5]
     mock_get_response.assert_called_once()
 
     # Verify that the response methods were called
     mock_response.Latitude.assert_called()
     mock_response.Hourly.assert_called()
     mock_response.Daily.assert_called()
+
+
+@patch("src.API.get_data.get_client")
+def test_call_api_batch(mock_get_client):
+    """Test that all the points are sent in a single request."""
+    mock_openmeteo = Mock()
+    mock_get_client.return_value = mock_openmeteo
+    mock_response = Mock()
+    mock_response.Hourly.return_value = None
+    mock_openmeteo.weather_api.return_value = [mock_response, mock_response]
+
+    daily_dataframe, hourly_dataframe = call_api_batch(
+        "test_url", [(48.85, 2.35), (45.76, 4.83)]
+    )
+
+    mock_openmeteo.weather_api.assert_called_once()
+    params = mock_openmeteo.weather_api.call_args.args[1]
+    assert params["latitude"] == "48.85,45.76"
+    assert params["longitude"] == "2.35,4.83"
+    assert "bounding_box" not in params
+    assert mock_response.Hourly.call_count == 2
+    assert daily_dataframe.empty
+    assert hourly_dataframe.empty
+
+
+def test_get_query_params_shares_the_template():
+    """Test that the queries are shallow copies of the read-only template."""
+    params = get_query_params(48.85, 2.35)
+
+    assert params["latitude"] == 48.85
+    assert params["hourly"] is QUERY_TEMPLATE["hourly"]
+    params["hourly"] = ()
+    assert QUERY_TEMPLATE["hourly"]
+    with pytest.raises(TypeError):
+        QUERY_TEMPLATE["timezone"] = "UTC"
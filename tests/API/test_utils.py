@@ -0,0 +1,91 @@
+import numpy as np
+
+from src.API.utils import (
+    QuadNode,
+    create_new_rectangles,
+    estimate_grid_size,
+    get_sized_bboxes,
+    max_quadtree_depth,
+    morton,
+    subdivide_batch,
+)
+
+
+def test_create_new_rectangles():
+    north = 100
+    south = 0
+    west = 50
+    est = 75
+    rectangles = create_new_rectangles(north=north, south=south, west=west, est=est)
+    assert len(rectangles) == 4
+
+
+def test_estimate_grid_size():
+    north = 100
+    south = 0
+    west = 50
+    est = 75
+    estimation = estimate_grid_size(north=north, south=south, west=west, est=est)
+    assert estimation > 1000
+
+
+def test_max_quadtree_depth():
+    # 1.6 / 0.05 = 32 = 2**5
+    assert max_quadtree_depth(north=1.6, south=0.0, west=0.0, est=1.0) == 5
+    assert max_quadtree_depth(north=0.01, south=0.0, west=0.0, est=0.01) == 0
+
+
+def test_quad_node_subdivide():
+    node = QuadNode((50.0, 40.0, 0.0, 10.0))
+    children = node.subdivide()
+    assert len(children) == 4
+    assert all(child.depth == 1 for child in children)
+    assert {child.bbox for child in children} == set(create_new_rectangles(*node.bbox))
+
+
+def test_quad_node_is_too_small():
+    assert QuadNode((50.04, 50.0, 0.0, 1.0)).is_too_small()
+    assert not QuadNode((50.06, 50.0, 0.0, 1.0)).is_too_small()
+
+
+def test_get_sized_bboxes_small_box():
+    leaves = get_sized_bboxes(north=49.0, south=48.0, west=5.0, est=6.0)
+    assert len(leaves) == 1
+    assert leaves[0].bbox == (49.0, 48.0, 5.0, 6.0)
+
+
+def test_get_sized_bboxes_large_box():
+    # 10x10 degrees -> 5x5 (2500 locations) -> 2.5x2.5 (625 locations)
+    leaves = get_sized_bboxes(north=50.0, south=40.0, west=0.0, est=10.0)
+    assert len(leaves) == 16
+    assert all(
+        estimate_grid_size(*leaf.bbox) <= 1000 and leaf.depth == 2 for leaf in leaves
+    )
+
+
+def test_morton():
+    assert morton(0, 0) == 0
+    assert morton(1, 0) == 0b01
+    assert morton(0, 1) == 0b10
+    assert morton(0b11, 0b00) == 0b0101
+    assert morton(0b11, 0b11) == 0b1111
+
+
+def test_quad_node_key():
+    parent = QuadNode((50.0, 40.0, 0.0, 10.0))
+    top_left = parent.subdivide()[0]
+    # Same north-west corner but not the same depth
+    assert top_left.key() != parent.key()
+    keys = {child.key() for child in parent.subdivide()}
+    assert len(keys) == 4
+
+
+def test_subdivide_batch():
+    bboxes = np.array([[50.0, 40.0, 0.0, 10.0], [49.0, 48.0, 5.0, 6.0]])
+    children = subdivide_batch(bboxes)
+    assert children.shape == (8, 4)
+    expected = [
+        *create_new_rectangles(50.0, 40.0, 0.0, 10.0),
+        *create_new_rectangles(49.0, 48.0, 5.0, 6.0),
+    ]
+    assert [tuple(child) for child in children.tolist()] == expected
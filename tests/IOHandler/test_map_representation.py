@@ -0,0 +1,247 @@
+"""Test the map_representation module."""
+
+from unittest.mock import patch
+
+import numpy as np
+
+from src.IOHandler import map_representation
+from src.IOHandler.map_representation import (
+    DEFAULT_LIMITS,
+    add_cities_to_image,
+    handle_mouse_move,
+    make_projector,
+    parse_coordinate,
+    parse_limits,
+    project_cities,
+)
+
+LIMITS = ["005 48 W", "10 E", "51 30 N", "41 N"]
+
+
+def test_parse_coordinate():
+    assert parse_coordinate("10 E") == 10.0
+    assert parse_coordinate("41 N") == 41.0
+    assert parse_coordinate("51 30 N") == 51.5
+    assert parse_coordinate("005 48 W") == -5.8
+    assert parse_coordinate("005  48 W") == -5.8
+    assert parse_coordinate("41 S ") == -41.0
+    hits = parse_coordinate.cache_info().hits
+    parse_coordinate("005 48 W")
+    assert parse_coordinate.cache_info().hits == hits + 1
+
+
+def test_parse_limits():
+    assert parse_limits(LIMITS) == (-5.8, 10.0, 51.5, 41.0)
+    # Any whitespace between and around the fields
+    assert parse_limits(["005  48 W", " 10 E", "51\t30 N", "41 S "]) == (
+        -5.8,
+        10.0,
+        51.5,
+        -41.0,
+    )
+    assert parse_limits(tuple(LIMITS)) is parse_limits(LIMITS)
+    assert parse_limits(LIMITS) == DEFAULT_LIMITS
+    west, east, north, south = DEFAULT_LIMITS
+    assert -180 <= west < east <= 180
+    assert -90 <= south < north <= 90
+
+
+def test_make_projector():
+    limits = (0.0, 10.0, 50.0, 40.0)
+    lon_of_x, lat_of_y = make_projector(100, 100, limits)
+
+    assert make_projector(100, 100, limits)[0] is lon_of_x
+    assert lon_of_x(0) == 0.0
+    assert lon_of_x(50) == 5.0
+    assert lat_of_y(0) == 50.0
+    assert lat_of_y(25) == 47.5
+
+    lon_of_x, lat_of_y = make_projector(400, 300, (-5.8, 10.0, 51.5, 41.0))
+    assert lon_of_x(0) == -5.8
+    assert lon_of_x(200) == 2.1
+    assert lat_of_y(300) == 41.0
+
+
+def test_project_cities():
+    limits = (0.0, 10.0, 50.0, 40.0)
+    cities = [
+        {"title": "center", "lat_long": (45.0, 5.0)},
+        {"title": "outside", "lat_long": (55.0, 5.0)},
+        {"title": "border", "lat_long": (50.0, 5.0)},
+        {"title": "corner", "lat_long": (40.5, 0.5)},
+        {"title": "east", "lat_long": (45.0, 10.0)},
+    ]
+    xs, ys, inside = project_cities(
+        cities, number_lines=100, number_col=100, limits=limits
+    )
+
+    assert inside.tolist() == [True, False, False, True, False]
+    assert (xs[0], ys[0]) == (50, 50)
+    assert (xs[3], ys[3]) == (5, 95)
+
+
+@patch("src.IOHandler.map_representation.cv.imshow")
+def test_handle_mouse_move_only_repaints_label(mock_imshow):
+    image = np.full((200, 400, 3), 255, dtype=np.uint8)
+    params = {
+        "image": image,
+        "win_name": "test",
+        "parsed_limits": (0.0, 10.0, 50.0, 40.0),
+    }
+
+    handle_mouse_move(0, 20, 50, 0, params)
+    handle_mouse_move(0, 20, 150, 0, params)
+
+    scratch = params["scratch"]
+    x0, y0, x1, y1 = params["label_box"]
+    # The first label has been erased, only the last one is drawn
+    outside = np.ones(image.shape[:2], dtype=bool)
+    outside[y0:y1, x0:x1] = False
+    assert np.array_equal(scratch[outside], image[outside])
+    assert not np.array_equal(scratch[y0:y1, x0:x1], image[y0:y1, x0:x1])
+    # The source image is never drawn on
+    assert (image == 255).all()
+    assert mock_imshow.call_count == 2
+
+
+@patch("src.IOHandler.map_representation.cv")
+def test_add_cities_reuses_projection(mock_cv):
+    image = np.zeros((100, 100, 3), dtype=np.uint8)
+    params = {
+        "image": image,
+        "init_map": image.copy(),
+        "win_name": "test",
+        "parsed_limits": (0.0, 10.0, 50.0, 40.0),
+        "toggle_cities": True,
+        "cities": [
+            {"title": "inside", "lat_long": (45.0, 5.0)},
+            {"title": "outside", "lat_long": (55.0, 5.0)},
+        ],
+    }
+
+    with patch.object(
+        map_representation,
+        "project_cities",
+        wraps=map_representation.project_cities,
+    ) as spy_project:
+        add_cities_to_image(params)  # show
+        add_cities_to_image(params)  # hide
+        add_cities_to_image(params)  # show again
+
+    spy_project.assert_called_once()
+    assert [city["title"] for city in params["cities"]] == ["inside"]
+    # The cities are only drawn once, then the cached map is shown again
+    assert mock_cv.putText.call_count == 1
+    assert params["image"] is params["cities_map"]
+    assert mock_cv.imshow.call_count == 3
+
+
+@patch("src.IOHandler.map_representation.cv")
+def test_add_cities_keeps_the_initial_map(mock_cv):
+    image = np.zeros((100, 100, 3), dtype=np.uint8)
+    mock_cv.putText.side_effect = lambda img, *_: img.fill(255)
+    params = {
+        "image": image.copy(),
+        "init_map": image,
+        "win_name": "test",
+        "parsed_limits": (0.0, 10.0, 50.0, 40.0),
+        "toggle_cities": True,
+        "cities": [{"title": "inside", "lat_long": (45.0, 5.0)}],
+    }
+
+    for _ in range(4):
+        add_cities_to_image(params)
+
+    assert params["image"] is image
+    assert not image.any()
+    assert params["cities_map"].all()
+
+    # New cities invalidate the cached map
+    params["cities"] = [{"title": "other", "lat_long": (42.0, 8.0)}]
+    add_cities_to_image(params)
+    assert mock_cv.putText.call_count == 2
+
+
+@patch("src.IOHandler.map_representation.cv.imshow")
+def test_handle_mouse_move_parses_limits_once(mock_imshow):
+    params = {"image": np.zeros((100, 100, 3), dtype=np.uint8), "win_name": "test"}
+    params["limits"] = LIMITS
+
+    with patch.object(
+        map_representation, "parse_limits", wraps=map_representation.parse_limits
+    ) as spy_parse:
+        handle_mouse_move(0, 10, 10, 0, params)
+        handle_mouse_move(0, 20, 20, 0, params)
+
+    spy_parse.assert_called_once_with(LIMITS)
+    assert params["parsed_limits"] == parse_limits(LIMITS)
+    assert mock_imshow.call_count == 2
+
+
+@patch("src.IOHandler.map_representation.cv")
+def test_add_cities_with_valid_coords(mock_cv):
+    image = np.zeros((100, 100, 3), dtype=np.uint8)
+    params = {
+        "image": image,
+        "init_map": image.copy(),
+        "win_name": "test",
+        "parsed_limits": (0.0, 10.0, 50.0, 40.0),
+        "toggle_cities": True,
+        "cities": [
+            {"title": "first", "lat_long": (45.0, 5.0)},
+            {"title": "outside", "lat_long": (45.0, 15.0)},
+            {"title": "second", "lat_long": (42.0, 8.0)},
+        ],
+    }
+
+    add_cities_to_image(params)
+
+    assert mock_cv.putText.call_count == 2
+    positions = [call.args[2] for call in mock_cv.putText.call_args_list]
+    assert positions == [(50, 50), (80, 80)]
+    assert all(isinstance(value, int) for position in positions for value in position)
+
+
+def test_draw_cities_keeps_the_image():
+    image = np.full((60, 120, 3), 255, dtype=np.uint8)
+    city_px = [({"title": "Lyon"}, (10, 30)), ({"title": "Nice"}, (60, 50))]
+
+    cities_map = map_representation.draw_cities(image, city_px)
+
+    assert (image == 255).all()
+    assert not (cities_map == 255).all()
+
+
+@patch("src.IOHandler.map_representation.cv")
+def test_handle_mouse_move_with_given_scratch(mock_cv):
+    mock_cv.getTextSize.return_value = ((50, 10), 4)
+    image = np.zeros((100, 100, 3), dtype=np.uint8)
+    params = {
+        "image": image,
+        "scratch": image.copy(),
+        "win_name": "test",
+        "parsed_limits": (0.0, 10.0, 50.0, 40.0),
+    }
+
+    handle_mouse_move(0, 50, 50, 0, params)
+    handle_mouse_move(0, 50, 50, 0, params)
+    assert mock_cv.imshow.call_count == 1
+
+
+@patch("src.IOHandler.map_representation.cv")
+def test_handle_mouse_move_skips_same_pixel(mock_cv):
+    mock_cv.getTextSize.return_value = ((50, 10), 4)
+    params = {
+        "image": np.zeros((100, 100, 3), dtype=np.uint8),
+        "win_name": "test",
+        "parsed_limits": (0.0, 10.0, 50.0, 40.0),
+    }
+
+    handle_mouse_move(0, 50, 50, 0, params)
+    handle_mouse_move(0, 50, 50, 0, params)
+    assert mock_cv.imshow.call_count == 1
+
+    # Once the image changed, the label is drawn again at the same pixel
+    map_representation.reset_scratch(params)
+    handle_mouse_move(0, 50, 50, 0, params)
+    assert mock_cv.imshow.call_count == 2
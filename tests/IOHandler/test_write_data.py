@@ -0,0 +1,371 @@
+"""Test the write_data module."""
+
+import os
+from collections import OrderedDict
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.IOHandler.write_data import (
+    _fast_to_csv,
+    _merge_csv,
+    _row_hash,
+    save_dataframe,
+)
+from src.IOHandler.writting_mods import SaveMode
+
+
+def make_weather_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "date": pd.date_range("2025-11-01", periods=3, freq="h", tz="UTC"),
+            "temperature_2m": np.array([10.5, np.nan, 0.1], dtype=np.float32),
+            "rain": [0.1 + 0.2, 0.0, 1e20],
+            "is_day": [1, 0, 1],
+            "flag": [True, False, True],
+        }
+    )
+
+
+def test_fast_to_csv_same_as_to_csv(tmp_path):
+    frame = make_weather_frame()
+    expected_file = tmp_path / "expected.csv"
+    fast_file = tmp_path / "fast.csv"
+
+    frame.to_csv(expected_file, sep=";", index_label="index")
+    _fast_to_csv(
+        frame, str(fast_file), sep=";", mode="w", header=True, index_label="index"
+    )
+
+    assert fast_file.read_text() == expected_file.read_text()
+
+
+def test_fast_to_csv_append_without_header(tmp_path):
+    frame = make_weather_frame()
+    expected_file = tmp_path / "expected.csv"
+    fast_file = tmp_path / "fast.csv"
+
+    for path in (expected_file, fast_file):
+        path.write_text("existing\n")
+    frame.to_csv(expected_file, mode="a", header=False, index_label="index")
+    _fast_to_csv(
+        frame, str(fast_file), sep=",", mode="a", header=False, index_label="index"
+    )
+
+    assert fast_file.read_text() == expected_file.read_text()
+
+
+def test_fast_to_csv_falls_back_for_text(tmp_path):
+    frame = pd.DataFrame({"city": ["Paris, France", 'a "quoted" name']})
+    expected_file = tmp_path / "expected.csv"
+    fast_file = tmp_path / "fast.csv"
+
+    frame.to_csv(expected_file, index_label="index")
+    _fast_to_csv(
+        frame, str(fast_file), sep=",", mode="w", header=True, index_label="index"
+    )
+
+    assert fast_file.read_text() == expected_file.read_text()
+
+
+def test_fast_to_csv_formats_plain_text(tmp_path):
+    frame = pd.DataFrame({"city": ["Paris", None, "", "Saint Étienne"], "x": range(4)})
+    expected_file = tmp_path / "expected.csv"
+    fast_file = tmp_path / "fast.csv"
+
+    frame.to_csv(expected_file, index_label="index")
+    with patch.object(pd.DataFrame, "to_csv") as mock_to_csv:
+        _fast_to_csv(
+            frame, str(fast_file), sep=",", mode="w", header=True, index_label="index"
+        )
+
+    mock_to_csv.assert_not_called()
+    assert fast_file.read_text() == expected_file.read_text()
+
+
+def test_save_dataframe_modes(tmp_path):
+    filename = str(tmp_path / "data.csv")
+    first = pd.DataFrame({"sizes": [10, 20], "origines": [1, 2]})
+    second = pd.DataFrame({"sizes": [20, 30], "origines": [2, 3]})
+
+    save_dataframe(first, filename, mode=SaveMode.INIT)
+    assert pd.read_csv(filename, index_col="index").equals(first)
+
+    save_dataframe(second, filename, mode="add")
+    assert len(pd.read_csv(filename)) == 4
+
+    save_dataframe(first, filename, mode=SaveMode.INIT)
+    save_dataframe(second, filename, mode="MERGE")
+    merged = pd.read_csv(filename, index_col="index")
+    assert merged[["sizes", "origines"]].values.tolist() == [
+        [10, 1],
+        [20, 2],
+        [30, 3],
+    ]
+
+
+def test_save_dataframe_wrong_extension(tmp_path):
+    filename = tmp_path / "data.txt"
+    save_dataframe(pd.DataFrame({"a": [1]}), str(filename))
+    assert not filename.exists()
+
+
+def test_merge_appends_new_rows(tmp_path):
+    filename = str(tmp_path / "data.csv")
+    old = pd.DataFrame({"sizes": [10, 20, 30, 40, 50], "origines": [1, 2, 3, 4, 5]})
+    new = pd.DataFrame({"sizes": [40, 20, 60, 60], "origines": [4, 2, 6, 6]})
+    save_dataframe(old, filename)
+    content = (tmp_path / "data.csv").read_text()
+
+    _merge_csv(new, filename, sep=",", index_label="index")
+
+    merged = pd.read_csv(filename, index_col="index")
+    assert merged.values.tolist() == [*old.values.tolist(), [60, 6]]
+    assert merged.index.tolist() == [0, 1, 2, 3, 4, 2]
+    # The old rows are left untouched
+    assert (tmp_path / "data.csv").read_text().startswith(content)
+    assert [path.name for path in tmp_path.iterdir()] == ["data.csv"]
+
+
+def test_merge_with_other_columns(tmp_path):
+    filename = str(tmp_path / "data.csv")
+    save_dataframe(pd.DataFrame({"sizes": [10, 20]}), filename)
+
+    save_dataframe(
+        pd.DataFrame({"sizes": [20], "origines": [2]}), filename, mode=SaveMode.MERGE
+    )
+
+    merged = pd.read_csv(filename, index_col="index")
+    assert merged["sizes"].tolist() == [10, 20, 20]
+    assert merged["origines"].isna().tolist() == [True, True, False]
+
+
+def test_save_dataframe_durable(tmp_path):
+    filename = str(tmp_path / "data.csv")
+    frame = pd.DataFrame({"sizes": [10, 20]})
+
+    with patch("src.IOHandler.write_data.os.fsync") as fsync:
+        save_dataframe(frame, filename)
+        fsync.assert_not_called()
+        save_dataframe(frame, filename, durable=True)
+        fsync.assert_called_once()
+
+
+def test_save_dataframe_several_files(tmp_path):
+    frames = [pd.DataFrame({"sizes": range(i, i + 3)}) for i in range(4)]
+    filenames = [str(tmp_path / f"data_{i}.csv") for i in range(4)]
+
+    save_dataframe(frames, filenames, max_workers=2)
+
+    for frame, filename in zip(frames, filenames, strict=True):
+        assert pd.read_csv(filename, index_col="index").equals(frame)
+
+
+def test_save_dataframe_same_file_in_order(tmp_path):
+    filename = str(tmp_path / "data.csv")
+    save_dataframe(pd.DataFrame({"sizes": [0]}), filename)
+
+    frames = [pd.DataFrame({"sizes": [i]}) for i in range(1, 6)]
+    save_dataframe(frames, [filename] * 5, mode="add", max_workers=4)
+
+    assert pd.read_csv(filename)["sizes"].tolist() == [0, 1, 2, 3, 4, 5]
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".feather"])
+def test_save_dataframe_columnar(tmp_path, suffix):
+    filename = str(tmp_path / f"data{suffix}")
+    first = pd.DataFrame({"sizes": [10, 20], "origines": [1, 2]})
+    second = pd.DataFrame({"sizes": [20, 30], "origines": [2, 3]})
+    read = pd.read_parquet if suffix == ".parquet" else pd.read_feather
+
+    save_dataframe(first, filename)
+    assert read(filename).set_index("index").equals(first.rename_axis("index"))
+
+    save_dataframe(second, filename, mode=SaveMode.ADD)
+    assert len(read(filename)) == 4
+
+    save_dataframe(first, filename)
+    save_dataframe(second, filename, mode=SaveMode.MERGE)
+    assert read(filename)[["sizes", "origines"]].values.tolist() == [
+        [10, 1],
+        [20, 2],
+        [30, 3],
+    ]
+
+
+def test_save_dataframe_skips_empty_frames(tmp_path):
+    filename = tmp_path / "data.csv"
+    save_dataframe(pd.DataFrame({"sizes": [10]}), str(filename))
+    content = filename.read_text()
+
+    for mode in (SaveMode.ADD, SaveMode.MERGE):
+        with patch("src.IOHandler.write_data._fast_to_csv") as fast_to_csv:
+            save_dataframe(pd.DataFrame(), str(filename), mode=mode)
+        fast_to_csv.assert_not_called()
+    assert filename.read_text() == content
+
+
+def test_save_dataframe_skips_wrong_extensions(tmp_path):
+    frames = [pd.DataFrame({"a": [i]}) for i in range(3)]
+    # A file named like a format, without the dot, is not in that format
+    filenames = [tmp_path / "data.txt", tmp_path / "csv", tmp_path / "data.csv"]
+
+    save_dataframe(frames, [str(filename) for filename in filenames])
+
+    assert not filenames[0].exists()
+    assert not filenames[1].exists()
+    assert pd.read_csv(filenames[2])["a"].tolist() == [2]
+
+
+def test_save_dataframe_keeps_the_file_on_error(tmp_path):
+    filename = tmp_path / "data.csv"
+    save_dataframe(pd.DataFrame({"sizes": [10]}), str(filename))
+    content = filename.read_text()
+
+    with (
+        patch("src.IOHandler.write_data._csv_text", side_effect=OSError),
+        patch("src.IOHandler.write_data.logger") as mock_logger,
+        pytest.raises(OSError),
+    ):
+        save_dataframe(pd.DataFrame({"sizes": [20]}), str(filename))
+
+    mock_logger.error.assert_called_once()
+
+    assert filename.read_text() == content
+    assert [path.name for path in tmp_path.iterdir()] == ["data.csv"]
+
+
+def test_merge_matches_missing_values(tmp_path):
+    filename = str(tmp_path / "data.csv")
+    save_dataframe(pd.DataFrame({"rain": [0.5, np.nan], "hour": [1, 2]}), filename)
+
+    save_dataframe(
+        pd.DataFrame({"rain": [np.nan], "hour": [2]}), filename, mode=SaveMode.MERGE
+    )
+
+    merged = pd.read_csv(filename, index_col="index")
+    assert merged["hour"].tolist() == [1, 2]
+
+
+def test_merge_reuses_the_cached_hashes(tmp_path):
+    filename = str(tmp_path / "data.csv")
+    save_dataframe(pd.DataFrame({"sizes": [10, 20], "origines": [1, 2]}), filename)
+    save_dataframe(
+        pd.DataFrame({"sizes": [20], "origines": [2]}), filename, mode=SaveMode.MERGE
+    )
+
+    with patch("src.IOHandler.write_data._row_hash", wraps=_row_hash) as spy_hash:
+        save_dataframe(
+            pd.DataFrame({"sizes": [30], "origines": [3]}),
+            filename,
+            mode=SaveMode.MERGE,
+        )
+        # Only the new row is hashed
+        assert spy_hash.call_count == 1
+
+        # The file changed, it has to be read again
+        save_dataframe(
+            pd.DataFrame({"sizes": [40], "origines": [4]}), filename, mode="add"
+        )
+        save_dataframe(
+            pd.DataFrame({"sizes": [10], "origines": [1]}),
+            filename,
+            mode=SaveMode.MERGE,
+        )
+        assert spy_hash.call_count == 1 + 4 + 1
+
+    merged = pd.read_csv(filename, index_col="index")
+    assert merged.values.tolist() == [[10, 1], [20, 2], [30, 3], [40, 4]]
+
+
+def test_merge_without_trailing_newline(tmp_path):
+    filename = tmp_path / "data.csv"
+    filename.write_text("index,sizes,origines\n0,10,1\n1,20,2")
+
+    save_dataframe(
+        pd.DataFrame({"sizes": [30], "origines": [3]}),
+        str(filename),
+        mode=SaveMode.MERGE,
+    )
+
+    merged = pd.read_csv(filename, index_col="index")
+    assert merged.values.tolist() == [[10, 1], [20, 2], [30, 3]]
+
+
+def test_merge_rows_with_another_dtype(tmp_path):
+    filename = str(tmp_path / "data.csv")
+    frame = pd.DataFrame({"sizes": [10, 20], "origines": [1, 2]})
+    save_dataframe(frame, filename)
+
+    # 10 and 10.0 are the same value, even if they are not written the same way
+    save_dataframe(frame.astype({"sizes": "float64"}), filename, mode=SaveMode.MERGE)
+
+    merged = pd.read_csv(filename, index_col="index")
+    assert merged.values.tolist() == [[10, 1], [20, 2]]
+
+
+def test_merge_after_init_with_the_same_stamp(tmp_path):
+    filename = str(tmp_path / "data.csv")
+    save_dataframe(pd.DataFrame({"sizes": [10, 20], "origines": [1, 2]}), filename)
+    save_dataframe(
+        pd.DataFrame({"sizes": [10], "origines": [1]}), filename, mode=SaveMode.MERGE
+    )
+
+    # Same size and modification time as the previous file
+    stat = os.stat(filename)
+    save_dataframe(pd.DataFrame({"sizes": [30, 40], "origines": [3, 4]}), filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    save_dataframe(
+        pd.DataFrame({"sizes": [10], "origines": [1]}), filename, mode=SaveMode.MERGE
+    )
+
+    merged = pd.read_csv(filename, index_col="index")
+    assert merged.values.tolist() == [[30, 3], [40, 4], [10, 1]]
+
+
+def test_merge_cache_keeps_the_last_files(tmp_path):
+    filenames = [str(tmp_path / f"data{i}.csv") for i in range(3)]
+    frame = pd.DataFrame({"sizes": [10], "origines": [1]})
+    save_dataframe([frame] * 3, filenames)
+
+    with (
+        patch("src.IOHandler.write_data.MERGE_CACHE_MAX_FILES", 2),
+        patch("src.IOHandler.write_data._row_hashes", OrderedDict()) as cache,
+    ):
+        for filename in [*filenames, filenames[1]]:
+            save_dataframe(frame, filename, mode=SaveMode.MERGE)
+        # The least recently merged file is dropped first
+        assert list(cache) == [filenames[2], filenames[1]]
+
+
+@pytest.mark.parametrize("engine", ["pyarrow", "c"])
+def test_merge_rewrite_with_each_engine(tmp_path, engine):
+    filename = str(tmp_path / "data.csv")
+    save_dataframe(pd.DataFrame({"sizes": [10, 20]}), filename)
+
+    with patch("src.IOHandler.write_data.CSV_ENGINE", engine):
+        save_dataframe(
+            pd.DataFrame({"sizes": [20], "origines": [2]}),
+            filename,
+            mode=SaveMode.MERGE,
+        )
+
+    merged = pd.read_csv(filename, index_col="index")
+    assert merged.columns.tolist() == ["sizes", "origines"]
+    assert merged["sizes"].tolist() == [10, 20, 20]
+
+
+def test_save_dataframe_thread_pool_size(tmp_path):
+    frames = [pd.DataFrame({"sizes": [i]}) for i in range(3)]
+
+    with patch("src.IOHandler.write_data.ThreadPoolExecutor") as mock_executor:
+        save_dataframe(frames[0], str(tmp_path / "single.csv"))
+        mock_executor.assert_not_called()
+
+        filenames = [str(tmp_path / f"data_{i}.csv") for i in range(3)]
+        save_dataframe(frames, filenames)
+        mock_executor.assert_called_once_with(max_workers=3)
+
+    assert (tmp_path / "single.csv").exists()